@@ -0,0 +1,216 @@
+import numpy as np
+
+# B TIC-TAC-TOE GAMES STEPPED AT ONCE, FOR TRAINING LEARNING AGENTS
+#
+# Cells hold 1 for Player 1 (X), -1 for Player 2 (O) and 0 for '_',
+# numbered 0-8 row by row (move 1 on the printed board is cell 0).
+
+
+X_MARK = 1
+O_MARK = -1
+
+WIN_LINES = np.array([[0, 1, 2], [3, 4, 5], [6, 7, 8],
+                      [0, 3, 6], [1, 4, 7], [2, 5, 8],
+                      [0, 4, 8], [2, 4, 6]], dtype=np.intp)
+
+MARKS = {'X': X_MARK, 'O': O_MARK, '_': 0}
+SYMBOLS = {X_MARK: 'X', O_MARK: 'O', 0: '_'}
+
+
+
+def batch_is_winner(boards: np.ndarray, marks: np.ndarray) -> np.ndarray:
+    """
+    Check every board for three in a row of the given mark, like isWinner.
+
+    Args:
+        boards: an int array of shape (B, 9).
+        marks: an int array of shape (B,) with X_MARK or O_MARK for each board.
+
+    Returns:
+        won: a bool array of shape (B,).
+    """
+
+    line_sums = boards[:, WIN_LINES].sum(axis=2, dtype=np.int8)
+
+    return (line_sums == 3 * marks[:, None]).any(axis=1)
+
+
+
+def batch_board_full(boards: np.ndarray) -> np.ndarray:
+    """
+    Check every board for empty cells, like boardIsFull.
+
+    Args:
+        boards: an int array of shape (B, 9).
+
+    Returns:
+        full: a bool array of shape (B,).
+    """
+
+    return (boards != 0).all(axis=1)
+
+
+
+def boards_from_lists(board_lists: list) -> np.ndarray:
+    """
+    Convert boards in the BoardClass layout into a (B, 9) array.
+
+    Args:
+        board_lists: a list of boards, each a list of 3 rows of 'X', 'O' or '_'.
+
+    Returns:
+        boards: an int8 array of shape (B, 9).
+    """
+
+    cells = [[MARKS[cell] for row in board for cell in row] for board in board_lists]
+
+    return np.array(cells, dtype=np.int8).reshape(len(board_lists), 9)
+
+
+
+def boards_to_lists(boards: np.ndarray) -> list:
+    """
+    Convert a (B, 9) array back into boards in the BoardClass layout.
+
+    Args:
+        boards: an int array of shape (B, 9).
+
+    Returns:
+        board_lists: a list of boards, each a list of 3 rows of 'X', 'O' or '_'.
+    """
+
+    board_lists = []
+
+    for cells in boards.tolist():
+        symbols = [SYMBOLS[cell] for cell in cells]
+        board_lists.append([symbols[0:3], symbols[3:6], symbols[6:9]])
+
+    return board_lists
+
+
+
+class BatchTicTacToeEnv:
+    """
+    A gym-like environment that plays B games of tic-tac-toe side by side.
+
+    Both players are driven through the same step() call, one move per game
+    per call, so it suits self-play. Observations are from the point of view
+    of the player about to move: 1 for their marks, -1 for the other player's.
+
+    Attributes:
+        batch_size: the number of games played at once.
+        boards: an int8 array of shape (B, 9) with the current boards.
+        to_move: an int8 array of shape (B,) with the mark of the player to move.
+        illegal_move_reward: the reward for playing on a taken cell, which
+            also ends that game.
+    """
+
+
+
+    def __init__(self, batch_size: int, illegal_move_reward: float = -1.0) -> None:
+        """
+        Initialize B empty boards with Player 1 to move.
+
+        Args:
+            batch_size: the number of games played at once.
+            illegal_move_reward: the reward for playing on a taken cell.
+        """
+
+        self.batch_size = batch_size
+        self.illegal_move_reward = illegal_move_reward
+        self.boards = np.zeros((batch_size, 9), dtype=np.int8)
+        self.to_move = np.full(batch_size, X_MARK, dtype=np.int8)
+        self.rows = np.arange(batch_size)
+
+
+
+    def reset(self) -> np.ndarray:
+        """
+        Clear every board, like resetGameBoard, with Player 1 to move.
+
+        Returns:
+            observation: an int8 array of shape (B, 9).
+        """
+
+        self.boards[:] = 0
+        self.to_move[:] = X_MARK
+
+        return self.observe()
+
+
+
+    def observe(self) -> np.ndarray:
+        """
+        Get the boards from the point of view of the player to move.
+
+        Returns:
+            observation: an int8 array of shape (B, 9).
+        """
+
+        return self.boards * self.to_move[:, None]
+
+
+
+    def legalMoves(self) -> np.ndarray:
+        """
+        Find the empty cells of every board.
+
+        Returns:
+            legal: a bool array of shape (B, 9).
+        """
+
+        return self.boards == 0
+
+
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        """
+        Play one move in every game and reset the games that finished.
+
+        Args:
+            actions: an int array of shape (B,) with a cell (0-8) for each game.
+
+        Returns:
+            A 4-tuple containing the next observations (B, 9), the rewards for
+                the player who just moved (B,), a bool array of finished games
+                (B,), and an info dictionary. info['final_boards'] holds the
+                boards before the reset and info['winner'] the mark that won
+                each game (0 for a tie or an unfinished game).
+
+        Raises:
+            ValueError: if there is not one action per game or an action is
+                not a cell from 0 to 8.
+        """
+
+        actions = np.asarray(actions, dtype=np.intp)
+
+        if actions.shape != (self.batch_size,):
+            raise ValueError(f'expected {self.batch_size} actions, got shape {actions.shape}')
+        if ((actions < 0) | (actions > 8)).any():
+            raise ValueError('actions must be cells from 0 to 8')
+
+        movers = self.to_move.copy()
+
+        legal = self.boards[self.rows, actions] == 0
+        self.boards[self.rows[legal], actions[legal]] = movers[legal]
+
+        won = legal & batch_is_winner(self.boards, movers)
+        tied = legal & ~won & batch_board_full(self.boards)
+        illegal = ~legal
+        dones = won | tied | illegal
+
+        rewards = np.zeros(self.batch_size, dtype=np.float32)
+        rewards[won] = 1.0
+        rewards[illegal] = self.illegal_move_reward
+
+        winner = np.zeros(self.batch_size, dtype=np.int8)
+        winner[won] = movers[won]
+        winner[illegal] = -movers[illegal]
+
+        info = {'final_boards': self.boards.copy(), 'winner': winner}
+
+        self.to_move = -self.to_move
+        self.boards[dones] = 0
+        self.to_move[dones] = X_MARK
+
+        return (self.observe(), rewards, dones, info)
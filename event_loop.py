@@ -0,0 +1,467 @@
+import os
+import selectors
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from profiling import span
+
+# ONE SELECTOR WATCHES THE TERMINAL, THE GAME SOCKET AND THE TURN TIMERS
+
+MOVE_TIMEOUT = 60.0
+IDLE_TIMEOUT = 300.0
+QUIT_MESSAGE = 'Quit'
+
+# probe a silent connection after 30 s and give up on it 3 missed probes later
+KEEPALIVE_IDLE = 30
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
+
+
+
+class StdinReader:
+    """
+    Read lines from stdin in a way a selector can wait on.
+
+    On POSIX the stdin file descriptor is selected on and read with os.read,
+    so lines typed ahead or pasted together are split up here instead of
+    sitting unseen in sys.stdin's buffer. Windows can only select on sockets,
+    so there a thread reads stdin and passes the lines on through a socket pair.
+
+    There is one reader for the whole program, shared by every GameEventLoop,
+    so no typed line is lost when a connection is replaced.
+
+    Attributes:
+        lines: a deque of complete lines not yet used, without newlines.
+        eof: True once stdin has been closed.
+    """
+
+
+
+    def __init__(self) -> None:
+        """
+        Set up reading from the stdin file descriptor, or start the thread on Windows.
+        """
+
+        self.lines = deque()
+        self.eof = False
+        self.buffer = b''
+
+        if os.name == 'nt':
+            self.source, writer = socket.socketpair()
+            threading.Thread(target=self._forward, args=(writer,), daemon=True).start()
+        else:
+            self.source = sys.stdin.fileno()
+
+
+
+    def fileobj(self) -> object:
+        """
+        Get what to register with a selector to know when stdin has data.
+
+        Returns:
+            The stdin file descriptor, or the socket the thread writes to.
+        """
+
+        return self.source
+
+
+
+    def read(self) -> None:
+        """
+        Read what is available and add any complete lines to self.lines.
+        """
+
+        if isinstance(self.source, socket.socket):
+            data = self.source.recv(1024)
+        else:
+            data = os.read(self.source, 1024)
+
+        if not data:
+            self.eof = True
+            if self.buffer:
+                self.lines.append(self.buffer.decode(errors='replace').rstrip('\r'))
+                self.buffer = b''
+            return
+
+        self.buffer += data
+        while b'\n' in self.buffer:
+            line, self.buffer = self.buffer.split(b'\n', 1)
+            self.lines.append(line.decode(errors='replace').rstrip('\r'))
+
+
+
+    def readLine(self, prompt: str) -> str:
+        """
+        Ask for a line and block until it is typed, like input().
+
+        Args:
+            prompt: the text shown to the player.
+
+        Returns:
+            line: the line typed by the player, without the newline.
+
+        Raises:
+            EOFError: if stdin is closed before a line is typed.
+        """
+
+        print(prompt, end='', flush=True)
+
+        while not self.lines and not self.eof:
+            self.read()
+
+        if not self.lines:
+            raise EOFError
+
+        return self.lines.popleft()
+
+
+
+    def _forward(self, writer: socket.socket) -> None:
+        """
+        Copy stdin lines to the socket pair until stdin closes (Windows only).
+
+        Args:
+            writer: the socket the selector side reads from.
+        """
+
+        for line in sys.stdin:
+            writer.sendall(line.encode())
+        writer.close()
+
+
+
+_stdin = None
+
+
+
+def stdin_reader() -> StdinReader:
+    """
+    Get the program's StdinReader, creating it the first time.
+
+    Returns:
+        reader: the shared StdinReader.
+    """
+
+    global _stdin
+
+    if _stdin is None:
+        _stdin = StdinReader()
+
+    return _stdin
+
+
+
+def read_line(prompt: str) -> str:
+    """
+    Read a line through the shared StdinReader, for prompts outside a game.
+
+    Args:
+        prompt: the text shown to the player.
+
+    Returns:
+        line: the line typed by the player, without the newline.
+    """
+
+    return stdin_reader().readLine(prompt)
+
+
+
+class SessionClosed(Exception):
+    """
+    Raised when the game session can not continue.
+
+    Attributes:
+        reason: a short message describing why the session ended.
+        resumable: True if only the connection was lost, so the session
+            can be picked up again.
+    """
+
+
+
+    def __init__(self, reason: str, resumable: bool = False) -> None:
+        """
+        Initialize the exception with the reason the session ended.
+
+        Args:
+            reason: a short message describing why the session ended.
+            resumable: True if only the connection was lost.
+        """
+
+        super().__init__(reason)
+        self.reason = reason
+        self.resumable = resumable
+
+
+
+class PlayerQuit(SessionClosed):
+    """
+    Raised when this player chose to leave the game.
+    """
+
+
+
+class ReconnectPending(SessionClosed):
+    """
+    Raised when a new connection is waiting on the listening socket.
+
+    The current connection may only look alive, so the caller checks the new
+    one and replaces the current connection if it resumes the session.
+    """
+
+
+
+class GameEventLoop:
+    """
+    Multiplex stdin, the game socket and the turn timers with one selector.
+
+    Messages on the socket are newline terminated, so several messages that
+    arrive in one recv are split up and kept until they are asked for.
+
+    Attributes:
+        conn: socket object connected to the other player.
+        move_timeout: seconds a player has to make a move, or None for no clock.
+        idle_timeout: seconds to wait on the other player, or None to wait forever.
+    """
+
+
+
+    def __init__(self, conn: socket.socket, move_timeout: float = MOVE_TIMEOUT,
+                 idle_timeout: float = IDLE_TIMEOUT) -> None:
+        """
+        Register the socket and stdin with a new selector.
+
+        TCP keepalive is turned on, so a connection that silently went away
+        is noticed even while nothing is being sent.
+
+        Args:
+            conn: socket object connected to the other player.
+            move_timeout: seconds a player has to make a move, or None for no clock.
+            idle_timeout: seconds to wait on the other player, or None to wait forever.
+        """
+
+        self.conn = conn
+        self.move_timeout = move_timeout
+        self.idle_timeout = idle_timeout
+        self.move_deadline = None
+        self.buffer = b''
+        self.messages = []
+        self.closed = False
+        self.stdin = stdin_reader()
+
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(conn, selectors.EVENT_READ, 'socket')
+        self.selector.register(self.stdin.fileobj(), selectors.EVENT_READ, 'stdin')
+
+
+
+    def acceptReconnects(self, listener: socket.socket) -> None:
+        """
+        Also watch a listening socket, so a reconnect is noticed during play.
+
+        Args:
+            listener: the listening socket the other player reconnects to.
+        """
+
+        self.selector.register(listener, selectors.EVENT_READ, 'listener')
+
+
+
+    def startMoveClock(self) -> None:
+        """
+        Start the clock for the current player's move.
+        """
+
+        if self.move_timeout is not None:
+            self.move_deadline = time.monotonic() + self.move_timeout
+
+
+
+    def stopMoveClock(self) -> None:
+        """
+        Stop the clock once the move has been made.
+        """
+
+        self.move_deadline = None
+
+
+
+    def send(self, message: str) -> None:
+        """
+        Send a single message to the other player.
+
+        Args:
+            message: the message to send, without a trailing newline.
+
+        Raises:
+            SessionClosed: if the other player is no longer connected.
+        """
+
+        with span('socket send'):
+            try:
+                self.conn.sendall((message + '\n').encode())
+            except OSError:
+                raise SessionClosed('Connection to the other player was lost', resumable=True)
+
+
+
+    def readInput(self, prompt: str) -> str:
+        """
+        Wait for a line from the player while still watching the socket.
+
+        Args:
+            prompt: the text shown to the player.
+
+        Returns:
+            line: the line typed by the player, without the newline.
+
+        Raises:
+            SessionClosed: if the player quits, the other player leaves or
+                reconnects, or the move clock runs out.
+        """
+
+        with span('input wait'):
+            print(prompt, end='', flush=True)
+
+            while True:
+                if self.stdin.lines:
+                    line = self.stdin.lines.popleft()
+                    if line.strip().lower() == 'quit':
+                        self._quit()
+                    return line
+
+                if self.stdin.eof:
+                    # stdin was closed, nobody is left to play
+                    self._quit()
+
+                # the other player should be waiting, so only keep messages for later
+                self._wait(self.move_deadline)
+
+                if self.move_deadline is not None and time.monotonic() >= self.move_deadline:
+                    print()
+                    self.send(QUIT_MESSAGE)
+                    raise SessionClosed('Ran out of time to make a move')
+
+
+
+    def readMessage(self) -> str:
+        """
+        Wait for the next message from the other player.
+
+        Typing 'quit' while waiting leaves the game, anything else is ignored.
+
+        Returns:
+            message: the next message sent by the other player.
+
+        Raises:
+            SessionClosed: if either player quits, the other player leaves or
+                reconnects, or the other player is idle for too long, which
+                may just be a connection that silently went away.
+        """
+
+        with span('socket recv'):
+            deadline = None
+            if self.idle_timeout is not None:
+                deadline = time.monotonic() + self.idle_timeout
+
+            while not self.messages:
+                while self.stdin.lines:
+                    if self.stdin.lines.popleft().strip().lower() == 'quit':
+                        self._quit()
+                    print('Please wait for the other player.')
+
+                if self.stdin.eof:
+                    self._quit()
+
+                self._wait(deadline)
+
+                if not self.messages and deadline is not None and time.monotonic() >= deadline:
+                    raise SessionClosed('The other player has been idle for too long', resumable=True)
+
+            return self.messages.pop(0)
+
+
+
+    def close(self) -> None:
+        """
+        Unregister everything from the selector and close the socket.
+        """
+
+        if self.closed:
+            return
+
+        self.closed = True
+        self.selector.close()
+        self.conn.close()
+
+
+
+    def _quit(self) -> None:
+        """
+        Tell the other player this player is leaving and end the session.
+
+        Raises:
+            PlayerQuit: always.
+        """
+
+        try:
+            self.send(QUIT_MESSAGE)
+        except SessionClosed:
+            pass
+        raise PlayerQuit('You left the game')
+
+
+
+    def _wait(self, deadline: float) -> None:
+        """
+        Wait until stdin or the socket is readable, or the deadline passes.
+
+        Lines read from stdin are added to self.stdin.lines and complete
+        messages from the socket to self.messages.
+
+        Args:
+            deadline: a time.monotonic() value to stop waiting at, or None.
+
+        Raises:
+            SessionClosed: if the other player quit or the connection dropped.
+            ReconnectPending: if a connection is waiting on the listening socket.
+        """
+
+        timeout = None
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.monotonic())
+
+        reconnect = False
+
+        for key, mask in self.selector.select(timeout):
+            if key.data == 'listener':
+                reconnect = True
+
+            elif key.data == 'stdin':
+                self.stdin.read()
+
+            elif key.data == 'socket':
+                try:
+                    data = self.conn.recv(1024)
+                except OSError:
+                    data = b''
+                if not data:
+                    raise SessionClosed('The other player disconnected', resumable=True)
+
+                self.buffer += data
+                while b'\n' in self.buffer:
+                    line, self.buffer = self.buffer.split(b'\n', 1)
+                    message = line.decode()
+                    if message == QUIT_MESSAGE:
+                        raise SessionClosed('The other player left the game')
+                    self.messages.append(message)
+
+        if reconnect:
+            raise ReconnectPending('The other player is reconnecting', resumable=True)
@@ -0,0 +1,477 @@
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from gameboard import BoardClass
+
+# LOCAL HTTP/JSON SERVICE THAT SUGGESTS THE BEST MOVE FOR A BOARD
+
+
+CACHE_SIZE = 4096
+WORKERS = 32
+MAX_BODY = 4096
+
+LINES = ((0, 1, 2), (3, 4, 5), (6, 7, 8),
+         (0, 3, 6), (1, 4, 7), (2, 5, 8),
+         (0, 4, 8), (2, 4, 6))
+
+# SYMMETRIES[k][i] is the cell of the original board that lands on cell i
+# after the k-th rotation/reflection of the board.
+SYMMETRIES = ((0, 1, 2, 3, 4, 5, 6, 7, 8),
+              (6, 3, 0, 7, 4, 1, 8, 5, 2),
+              (8, 7, 6, 5, 4, 3, 2, 1, 0),
+              (2, 5, 8, 1, 4, 7, 0, 3, 6),
+              (2, 1, 0, 5, 4, 3, 8, 7, 6),
+              (6, 7, 8, 3, 4, 5, 0, 1, 2),
+              (0, 3, 6, 1, 4, 7, 2, 5, 8),
+              (8, 5, 2, 7, 4, 1, 6, 3, 0))
+
+
+
+class ResponseCache:
+    """
+    A bounded least recently used cache of solved positions.
+
+    Attributes:
+        size: the maximum number of positions to keep.
+    """
+
+
+
+    def __init__(self, size: int = CACHE_SIZE) -> None:
+        """
+        Initialize an empty cache.
+
+        Args:
+            size: the maximum number of positions to keep.
+        """
+
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+
+
+    def get(self, key: str) -> tuple:
+        """
+        Look up a position and mark it as recently used.
+
+        Args:
+            key: the canonical key of the position.
+
+        Returns:
+            entry: the cached entry, or None if the position is not cached.
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+
+
+    def put(self, key: str, entry: tuple) -> None:
+        """
+        Store a position, dropping the least recently used one if full.
+
+        Args:
+            key: the canonical key of the position.
+            entry: the solved result for the position.
+        """
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+
+def flatten_board(board: list[list[str, str, str]]) -> str:
+    """
+    Check the layout of a board and flatten it to a 9 character string.
+
+    Args:
+        board: a list of a list of rows storing the tic-tac-toe board.
+
+    Returns:
+        cells: the board read row by row, e.g. 'X_O______'.
+
+    Raises:
+        ValueError: if the board is not a 3x3 board of 'X', 'O' and '_' that
+            can be reached by taking turns.
+    """
+
+    if not isinstance(board, list) or len(board) != 3:
+        raise ValueError('board must be a list of 3 rows')
+
+    for row in board:
+        if not isinstance(row, list) or len(row) != 3:
+            raise ValueError('each row must be a list of 3 cells')
+        for cell in row:
+            if cell not in ('X', 'O', '_'):
+                raise ValueError("cells must be 'X', 'O' or '_'")
+
+    cells = ''.join(board[0] + board[1] + board[2])
+
+    x_count = cells.count('X')
+    o_count = cells.count('O')
+
+    if x_count - o_count not in (0, 1):
+        raise ValueError('Player 1 (X) moves first and players take turns')
+
+    x_line = has_line(cells, 'X')
+    o_line = has_line(cells, 'O')
+
+    # the game stops at the first line, so only the player who just moved can have one
+    if x_line and o_line:
+        raise ValueError('both players can not have three in a row')
+    if x_line and x_count == o_count:
+        raise ValueError('Player 2 can not move after Player 1 has won')
+    if o_line and x_count != o_count:
+        raise ValueError('Player 1 can not move after Player 2 has won')
+
+    return cells
+
+
+
+def canonical_key(cells: str) -> tuple[str, tuple]:
+    """
+    Find the same key for every rotation and reflection of a board.
+
+    Args:
+        cells: the board as a 9 character string.
+
+    Returns:
+        A 2-tuple containing the canonical board string, and the symmetry
+            that maps the board onto it.
+    """
+
+    best = None
+    best_symmetry = None
+
+    for symmetry in SYMMETRIES:
+        key = ''.join([cells[i] for i in symmetry])
+        if best is None or key < best:
+            best = key
+            best_symmetry = symmetry
+
+    return (best, best_symmetry)
+
+
+
+def has_line(cells: str, mark: str) -> bool:
+    """
+    Check if a mark has three in a row.
+
+    Args:
+        cells: the board as a 9 character string.
+        mark: 'X' or 'O'.
+
+    Returns:
+        found: a boolean value indicating whether the mark has a line.
+    """
+
+    for a, b, c in LINES:
+        if cells[a] == cells[b] == cells[c] == mark:
+            return True
+
+    return False
+
+
+
+def line_winner(cells: str) -> str:
+    """
+    Find the mark that has three in a row.
+
+    Args:
+        cells: the board as a 9 character string.
+
+    Returns:
+        mark: 'X' or 'O' if that mark has three in a row, otherwise ''.
+    """
+
+    for a, b, c in LINES:
+        if cells[a] != '_' and cells[a] == cells[b] == cells[c]:
+            return cells[a]
+
+    return ''
+
+
+
+@lru_cache(maxsize=None)
+def negamax(cells: str, mark: str) -> tuple[int, int]:
+    """
+    Solve a position for the player about to move.
+
+    Faster wins and slower losses score further from zero.
+
+    Args:
+        cells: the board as a 9 character string with no winner yet.
+        mark: 'X' or 'O', the mark of the player about to move.
+
+    Returns:
+        A 2-tuple containing the score for the player to move, and the
+            index (0-8) of the best cell, or -1 if the board is full.
+    """
+
+    other = 'O' if mark == 'X' else 'X'
+    best_score = None
+    best_move = -1
+
+    for i in range(9):
+        if cells[i] != '_':
+            continue
+
+        after = cells[:i] + mark + cells[i+1:]
+
+        if line_winner(after):
+            score = after.count('_') + 1
+        elif '_' not in after:
+            score = 0
+        else:
+            score = -negamax(after, other)[0]
+
+        if best_score is None or score > best_score:
+            best_score = score
+            best_move = i
+
+    if best_score is None:
+        best_score = 0
+
+    return (best_score, best_move)
+
+
+
+def suggest_move(board: list[list[str, str, str]], cache: ResponseCache = None) -> dict:
+    """
+    Work out the status of a board and the best move for the player to move.
+
+    Args:
+        board: a list of a list of rows storing the tic-tac-toe board.
+        cache: the ResponseCache to answer repeated positions from.
+
+    Returns:
+        result: a dictionary with the 'status' of the game, the player whose
+            turn it is ('to_move'), the best 'move' (1-9) and its 'evaluation'
+            for that player (1 win, 0 draw, -1 loss).
+
+    Raises:
+        ValueError: if the board is not a valid tic-tac-toe board.
+    """
+
+    cells = flatten_board(board)
+    key, symmetry = canonical_key(cells)
+
+    entry = None
+    if cache is not None:
+        entry = cache.get(key)
+
+    if entry is None:
+        # any symmetric board has the same status and turn, so solve the key
+        key_board = [list(key[0:3]), list(key[3:6]), list(key[6:9])]
+        checker = BoardClass()
+
+        if checker.isWinner('Player 1', key_board):
+            entry = ('Player 1 won', None, None, None)
+        elif checker.isWinner('Player 2', key_board):
+            entry = ('Player 2 won', None, None, None)
+        elif checker.boardIsFull(key_board):
+            entry = ('tied', None, None, None)
+        else:
+            if key.count('X') == key.count('O'):
+                to_move, mark = 'Player 1', 'X'
+            else:
+                to_move, mark = 'Player 2', 'O'
+            score, key_move = negamax(key, mark)
+            evaluation = (score > 0) - (score < 0)
+            entry = ('in progress', to_move, key_move, evaluation)
+
+        if cache is not None:
+            cache.put(key, entry)
+
+    status, to_move, key_move, evaluation = entry
+
+    move = None
+    if key_move is not None:
+        # the key's cell i is the original board's cell symmetry[i]
+        move = symmetry[key_move] + 1
+
+    return {'status': status, 'to_move': to_move, 'move': move, 'evaluation': evaluation}
+
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    An HTTPServer that handles each request on a fixed pool of threads.
+
+    Attributes:
+        cache: the ResponseCache shared by every request.
+    """
+
+    request_queue_size = 1024
+
+
+
+    def __init__(self, address: tuple[str, int], workers: int = WORKERS,
+                 cache_size: int = CACHE_SIZE) -> None:
+        """
+        Bind the server and start the thread pool.
+
+        Args:
+            address: a 2-tuple containing the host and port to listen on.
+            workers: the number of threads handling requests.
+            cache_size: the number of positions to keep in the cache.
+        """
+
+        super().__init__(address, HintRequestHandler)
+        self.cache = ResponseCache(cache_size)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+
+
+    def process_request(self, request: object, client_address: tuple) -> None:
+        """
+        Hand the request to the thread pool instead of handling it inline.
+        """
+
+        self.pool.submit(self._handle, request, client_address)
+
+
+
+    def _handle(self, request: object, client_address: tuple) -> None:
+        """
+        Handle one request on a pool thread and always close it.
+        """
+
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+
+    def server_close(self) -> None:
+        """
+        Stop listening and wait for the running requests to finish.
+        """
+
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+
+class HintRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answer POST /suggest with the best move for the board in the JSON body.
+
+    The body looks like {"board": [["X","_","_"], ["_","O","_"], ["_","_","_"]]},
+    the same layout printBoard shows.
+    """
+
+    server_version = 'TicTacToeHints/1.0'
+
+
+
+    def do_GET(self) -> None:
+        """
+        Answer GET /health so the front end can check the service is up.
+        """
+
+        if self.path == '/health':
+            self._reply(200, {'status': 'ok'})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+
+
+    def do_POST(self) -> None:
+        """
+        Answer POST /suggest with the status and best move for a board.
+        """
+
+        if self.path != '/suggest':
+            self._reply(404, {'error': 'not found'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self._reply(400, {'error': 'invalid Content-Length'})
+            return
+
+        if length < 0:
+            self._reply(400, {'error': 'invalid Content-Length'})
+            return
+        if length > MAX_BODY:
+            self._reply(413, {'error': f'body must be at most {MAX_BODY} bytes'})
+            return
+
+        try:
+            board = json.loads(self.rfile.read(length))['board']
+            result = suggest_move(board, self.server.cache)
+        except (ValueError, KeyError, TypeError) as error:
+            self._reply(400, {'error': str(error)})
+            return
+
+        self._reply(200, result)
+
+
+
+    def log_message(self, format: str, *args: object) -> None:
+        """
+        Skip the per-request access log, it costs more than the request.
+        """
+
+
+
+    def _reply(self, code: int, body: dict) -> None:
+        """
+        Send a JSON response.
+
+        Args:
+            code: the HTTP status code.
+            body: the dictionary to send as JSON.
+        """
+
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+
+def run_hint_server() -> None:
+    """
+    Run the move suggestion service until interrupted.
+    """
+
+    parser = argparse.ArgumentParser(description='Tic-tac-toe move suggestion service.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='number of request threads')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='number of cached positions')
+    args = parser.parse_args()
+
+    server = PooledHTTPServer((args.host, args.port), args.workers, args.cache_size)
+    print(f'Serving move suggestions at http://{args.host}:{args.port}/suggest')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        server.server_close()
+
+
+
+if __name__ == "__main__":
+    run_hint_server()
@@ -1,8 +1,15 @@
 import socket
+import time
 from gameboard import BoardClass
+from event_loop import IDLE_TIMEOUT, GameEventLoop, SessionClosed, read_line
+from profiling import profile_session, span
+from sessions import RESUME_PREFIX, SESSION_PREFIX, SessionSnapshot
 
 # PLAYER 1 WILL ACT AS THE CLIENT
 
+RESUME_ATTEMPTS = 5
+RESUME_DELAY = 1.0
+
 
 def p1_instructions():
     """
@@ -29,44 +36,51 @@ def p2_details() -> tuple[str, int]:
         ValueError: value error if the port input is not an integer value.
     """
     
-    p2_host_input = input('Enter the host name/IP address of player 2: ')
-    p2_port_input = int(input('Enter the port number: '))
+    p2_host_input = read_line('Enter the host name/IP address of player 2: ')
+    p2_port_input = int(read_line('Enter the port number: '))
     
     return (p2_host_input, p2_port_input)
 
 
    
-def p2_connection() -> tuple[str, object]:
+def p2_connection() -> tuple[str, GameEventLoop, str]:
     """
     Establish a successful connection to player 2.
 
     Returns:
-        A 2-tuple containing player 2's username, and the socket object.
+        A 3-tuple containing player 2's username, the GameEventLoop for the
+            connection, and the session token used to resume the game.
     """
     
     conn = True
     p2_username = ''
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    loop = None
+    token = ''
 
     while conn:
         try:
             p2_host, p2_port = p2_details()   
             print(f"Establishing connection to player 2 at {p2_host, p2_port}")
-            s.connect((p2_host, p2_port))
+            s = socket.create_connection((p2_host, p2_port))
             print('Connection successfully established\n')
-            
+
+            loop = GameEventLoop(s)
             p1_username = 'Player 1'
-            s.sendall(p1_username.encode())
-            p2_username = s.recv(1024).decode()
+            loop.send(p1_username)
+            p2_username = loop.readMessage()
+            token = loop.readMessage().removeprefix(f'{SESSION_PREFIX} ')
             print(f"Player 2's username: {p2_username}\n")
             conn = False
         except:
+            if loop is not None:
+                loop.close()
+                loop = None
             print('Unable to connect to Player 2')
-            retry = input('Do you want to try again? (y/n): ')
+            retry = read_line('Do you want to try again? (y/n): ')
             print()
 
             while retry not in ['y', 'Y', 'n', 'N']:
-                retry = input("Invalid input. Input 'y' or 'n': ")
+                retry = read_line("Invalid input. Input 'y' or 'n': ")
             
             if retry in ['y', 'Y']:
                 continue
@@ -77,7 +91,61 @@ def p2_connection() -> tuple[str, object]:
     # if p2_username = '' then that means the user didn't want to try again
     # otherwise p2_username will should equal 'Player 2'
 
-    return (p2_username, s)
+    return (p2_username, loop, token)
+
+
+
+def resume_session(address: tuple[str, int], token: str) -> tuple[GameEventLoop, SessionSnapshot]:
+    """
+    Reconnect to player 2 and pick the session up where it was left.
+
+    The first attempt is made straight away, then the wait doubles between
+    attempts.
+
+    Args:
+        address: a 2-tuple containing the host and port of player 2.
+        token: the session token player 2 sent when the game started.
+
+    Returns:
+        A 2-tuple containing the GameEventLoop for the new connection, and
+            player 2's snapshot of the session.
+
+    Raises:
+        SessionClosed: if player 2 can not be reached or no longer has the session.
+    """
+
+    delay = RESUME_DELAY
+
+    for attempt in range(RESUME_ATTEMPTS):
+        if attempt:
+            time.sleep(delay)
+            delay *= 2
+
+        try:
+            s = socket.create_connection(address, timeout=RESUME_DELAY * 5)
+            s.settimeout(None)
+        except OSError:
+            continue
+
+        # an attempt that connects but gets no reply must not use up the others
+        loop = GameEventLoop(s, idle_timeout=RESUME_DELAY * 5)
+        try:
+            loop.send(f'{RESUME_PREFIX} {token}')
+            if loop.readMessage() == 'Player 2':
+                snapshot = SessionSnapshot.decode(loop.readMessage())
+                loop.idle_timeout = IDLE_TIMEOUT
+                return (loop, snapshot)
+            loop.close()
+            raise SessionClosed('Player 2 no longer has this game')
+        except ValueError:
+            pass
+        except SessionClosed as error:
+            if not error.resumable:
+                loop.close()
+                raise
+        loop.close()
+
+    raise SessionClosed('Unable to reconnect to Player 2')
 
     
 
@@ -151,7 +219,7 @@ def check_valid_move(move: int, current_board: list[list[str, str, str]]) -> boo
 
 
 
-def update_valid_board(move: str, player: str, board: list[list[str, str, str]], p1_obj: object) -> str:
+def update_valid_board(move: str, player: str, board: list[list[str, str, str]], p1_obj: object, read_input: object = read_line) -> str:
     """
     Obtain valid moves, and update the tic-tac-toe board.
 
@@ -160,6 +228,7 @@ def update_valid_board(move: str, player: str, board: list[list[str, str, str]],
         player: username of the player who made the move.
         board: a list of a list of rows storing the tic-tac-toe board.
         p1_obj: Boardclass object for player 1.
+        read_input: function used to ask the player for another move.
 
     Returns:
         move: a string containing the integer value of where to place the X/O 
@@ -172,15 +241,15 @@ def update_valid_board(move: str, player: str, board: list[list[str, str, str]],
             move = int(move)
 
             if move <= 0 or move >= 10:
-                move = input('Invalid move. Try again: ')
+                move = read_input('Invalid move. Try again: ')
             else:
                 valid = check_valid_move(move, board)
                 if valid:
                     get_input = False
                 else:
-                    move = input('Invalid move. Try again: ')
-        except:
-            move = input('Invalid move. Try again: ')
+                    move = read_input('Invalid move. Try again: ')
+        except ValueError:
+            move = read_input('Invalid move. Try again: ')
 
     p1_obj.updateGameBoard(move, player, board)
     p1_obj.printBoard(board)
@@ -189,7 +258,42 @@ def update_valid_board(move: str, player: str, board: list[list[str, str, str]],
 
     
 
-def end_game(move: int, player: str, board: list[list[str, str, str]], instance: object, s: object) -> tuple[list[list[str, str, str]], bool, bool]:
+def play_again(board: list[list[str, str, str]], instance: object, loop: GameEventLoop) -> tuple[list[list[str, str, str]], bool, bool]:
+    """
+    Ask whether to play again once a game is over, and tell player 2.
+
+    Args:
+        board: a list of a list of rows storing the tic-tac-toe board.
+        instance: Boardclass object for player 1.
+        loop: GameEventLoop for the connection to player 2.
+
+    Returns:
+        A 3-tuple containing a list of a list of rows for the tic-tac-toe board,
+            and two boolean values indicating whether to end and reset the game.
+    """
+
+    reset_game = False
+    end = False
+
+    retry = loop.readInput("Do you want to play again? (y/n): ")
+
+    while retry not in ['y', 'Y', 'n', 'N']:
+        retry = loop.readInput("Invalid input. Input 'y' or 'n': ")
+    
+    if retry in ['y', 'Y']:
+        loop.send('Play Again')
+        board = instance.resetGameBoard(board)
+        reset_game = True
+    elif retry in ['n', 'N']:
+        loop.send('Fun Times')
+        instance.printStats()
+        end = True
+
+    return board, end, reset_game
+
+
+
+def end_game(move: int, player: str, board: list[list[str, str, str]], instance: object, loop: GameEventLoop) -> tuple[list[list[str, str, str]], bool, bool]:
     """
     Specify whether to play again or not, and reset the game accordingly.
 
@@ -198,7 +302,7 @@ def end_game(move: int, player: str, board: list[list[str, str, str]], instance:
         player: username of the player who made the move.
         board: a list of a list of rows storing the tic-tac-toe board.
         instance: Boardclass object for player 1.
-        s: socket object
+        loop: GameEventLoop for the connection to player 2.
 
     Returns:
         A 3-tuple containing a list of a list of rows for the tic-tac-toe board,
@@ -208,17 +312,11 @@ def end_game(move: int, player: str, board: list[list[str, str, str]], instance:
     reset_game = False
     end = False
 
-    if check_game_over(move, player, board, instance):
-        retry = input("Do you want to play again?")
-        
-        if retry in ['y', 'Y']:
-            s.sendall('Play Again'.encode())
-            board = instance.resetGameBoard(board)
-            reset_game = True
-        elif retry in ['n', 'N']:
-            s.sendall('Fun Times'.encode())
-            instance.printStats()
-            end = True
+    with span('check_game_over'):
+        game_over = check_game_over(move, player, board, instance)
+
+    if game_over:
+        board, end, reset_game = play_again(board, instance, loop)
 
     return board, end, reset_game
 
@@ -227,8 +325,12 @@ def end_game(move: int, player: str, board: list[list[str, str, str]], instance:
 def run_player1() -> None:
     """
     Run the game for player 1.
+
+    If the connection to player 2 drops, or player 2 goes quiet for so long
+    that the connection may have silently dropped, the game is resumed from
+    player 2's snapshot of the session.
     """
-    p2_username, s = p2_connection()
+    p2_username, loop, token = p2_connection()
     p1 = BoardClass(user='Player 1')
 
     p1_board = [
@@ -239,41 +341,83 @@ def run_player1() -> None:
     
     game = True
     
-    if p2_username == 'Player 2':
-        p1_instructions()
-        while game:            
-            p1_move = input("Player 1's move: ")
-            p1.setPrevious('Player 1')
-
-            p1_move = update_valid_board(p1_move, 'Player 1', p1_board, p1)
-            
-            s.sendall(p1_move.encode())
-            
-            p1_board, end, reset_game = end_game(p1_move, 'Player 1', p1_board, p1, s)
-            if end:
-                game = False
-                continue
-            if reset_game:
-                continue
+    if p2_username != 'Player 2':
+        if loop is not None:
+            loop.close()
+        return
+
+    address = loop.conn.getpeername()
+    p1_instructions()
+    print("Type 'quit' at any time to leave the game.\n")
+
+    try:
+        while game:
+            try:
+                if p1.isWinner('Player 1', p1_board) or p1.isWinner('Player 2', p1_board) or p1.boardIsFull(p1_board):
+                    # only after resuming a game that was already over
+                    p1_board, end, reset_game = play_again(p1_board, p1, loop)
+                    if end:
+                        game = False
+                    continue
+
+                if sum(row.count('X') for row in p1_board) == sum(row.count('O') for row in p1_board):
+                    loop.startMoveClock()
+                    p1_move = loop.readInput("Player 1's move: ")
+                    p1.setPrevious('Player 1')
+
+                    with span('update_valid_board'):
+                        p1_move = update_valid_board(p1_move, 'Player 1', p1_board, p1, loop.readInput)
+                    loop.stopMoveClock()
+                    
+                    loop.send(p1_move)
+                    
+                    p1_board, end, reset_game = end_game(p1_move, 'Player 1', p1_board, p1, loop)
+                    if end:
+                        game = False
+                        continue
+                    if reset_game:
+                        continue
+                        
                 
-            
-            p2_move = s.recv(1024).decode()
-            p1.setPrevious('Player 2')
-            
-            print(f"Player 2's move: {p2_move}")
+                p2_move = loop.readMessage()
+                p1.setPrevious('Player 2')
+                
+                print(f"Player 2's move: {p2_move}")
 
-            p1.updateGameBoard(int(p2_move), 'Player 2', p1_board)
-            p1.printBoard(p1_board)
-            
-            p1_board, end, reset = end_game(p2_move, 'Player 2', p1_board, p1, s)
-            if end:
-                game = False
-                continue
-            if reset_game:
-                continue
+                if not p2_move.isdigit() or not 1 <= int(p2_move) <= 9 or not check_valid_move(int(p2_move), p1_board):
+                    raise SessionClosed('Player 2 sent an invalid move')
+
+                p1.updateGameBoard(int(p2_move), 'Player 2', p1_board)
+                p1.printBoard(p1_board)
+                
+                p1_board, end, reset_game = end_game(p2_move, 'Player 2', p1_board, p1, loop)
+                if end:
+                    game = False
+                    continue
+                if reset_game:
+                    continue
+
+            except SessionClosed as error:
+                if not error.resumable:
+                    raise
+
+                print(f'\n{error.reason}. Reconnecting...')
+                loop.close()
+                loop, snapshot = resume_session(address, token)
+                p1_board = snapshot.restore(p1, 'Player 1')
+                loop.stopMoveClock()
+
+                print(f'Game resumed at update {snapshot.seq}.')
+                p1.printBoard(p1_board)
+
+    except SessionClosed as error:
+        print(f'\n{error.reason}.')
+        p1.printStats()
+
+    finally:
+        loop.close()
             
                     
 
 if __name__ == "__main__":
-    run_player1()
-    
+    profile_session(run_player1)
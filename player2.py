@@ -1,9 +1,20 @@
+import os
+import secrets
+import selectors
 import socket
+import time
 from gameboard import BoardClass
+from event_loop import IDLE_TIMEOUT, GameEventLoop, PlayerQuit, ReconnectPending, SessionClosed, read_line, stdin_reader
+from profiling import profile_session, span
+from spectators import SPECTATOR_ENV, SpectatorHub
+from sessions import RESUME_PREFIX, SESSION_PREFIX, SessionSnapshot
 
 
 # PLAYER 2 WILL ACT AS THE SERVER
 
+RESUME_TIMEOUT = 120.0
+HANDSHAKE_TIMEOUT = 5.0
+
 def p2_instructions():
     """
     Define the instructions to play the game.
@@ -29,8 +40,8 @@ def p1_details() -> tuple[str, int]:
         ValueError: value error if the port input is not an integer value.
     """
     
-    p1_host_input = input('Enter the host name/IP address: ')
-    p1_port_input = input('Enter the port number: ')
+    p1_host_input = read_line('Enter the host name/IP address: ')
+    p1_port_input = read_line('Enter the port number: ')
 
     if p1_port_input.isnumeric():
         p1_port_input = int(p1_port_input)
@@ -87,27 +98,134 @@ def p1_connection() -> object:
 
 
 
-def exchange_usernames() -> tuple[str, object, object]:
+def exchange_usernames(snapshot: SessionSnapshot) -> tuple[str, object, GameEventLoop]:
     """
     Send player 2's username and recieve player 1's username.
 
+    Player 1 is also sent the session token it needs to resume the game.
+
+    Args:
+        snapshot: the SessionSnapshot for this session.
+
     Returns:
-        A 3-tuple containing player 1's username, socket object, connection address. 
+        A 3-tuple containing player 1's username, socket object, and the
+            GameEventLoop for the connection.
     """
     
     s = p1_connection()
     s.listen(1)
 
     conn, addr = s.accept()
-    p1_username = conn.recv(1024).decode()
+    loop = GameEventLoop(conn)
+    p1_username = loop.readMessage()
     print(f"Player 1's username: {p1_username}")
     print()
 
     if p1_username:
         p2_username = 'Player 2'
-        conn.sendall(p2_username.encode())
+        loop.send(p2_username)
+        loop.send(f'{SESSION_PREFIX} {snapshot.token}')
+
+    loop.acceptReconnects(s)
+
+    return (p1_username, s, loop)
+
+
+
+def accept_resume(s: object, snapshot: SessionSnapshot) -> GameEventLoop:
+    """
+    Accept one connection and check that it is player 1 resuming the session.
+
+    The connection gets HANDSHAKE_TIMEOUT seconds to send its token, so a
+    silent connection can not hold up player 1's real reconnect.
+
+    Args:
+        s: the listening socket object.
+        snapshot: the SessionSnapshot for this session.
+
+    Returns:
+        loop: the GameEventLoop for the new connection, or None if it was not
+            player 1 resuming this session.
+
+    Raises:
+        PlayerQuit: if player 2 quits during the handshake.
+    """
+
+    conn, addr = s.accept()
+    loop = GameEventLoop(conn, idle_timeout=HANDSHAKE_TIMEOUT)
+    expected = f'{RESUME_PREFIX} {snapshot.token}'.encode()
+
+    try:
+        if secrets.compare_digest(loop.readMessage().encode(), expected):
+            loop.send('Player 2')
+            loop.send(snapshot.encode())
+            loop.idle_timeout = IDLE_TIMEOUT
+            loop.acceptReconnects(s)
+            return loop
+        loop.send('Unknown session')
+    except PlayerQuit:
+        loop.close()
+        raise
+    except SessionClosed:
+        pass
+
+    loop.close()
+
+    return None
+
+
+
+def wait_for_resume(s: object, snapshot: SessionSnapshot) -> GameEventLoop:
+    """
+    Wait for player 1 to reconnect and send it the session snapshot.
+
+    Stdin is watched while waiting, so typing 'quit' still leaves the game.
+
+    Args:
+        s: the listening socket object.
+        snapshot: the SessionSnapshot for this session.
+
+    Returns:
+        loop: the GameEventLoop for the new connection.
+
+    Raises:
+        SessionClosed: if player 1 does not come back in time, or player 2 quits.
+    """
+
+    print(f"Waiting up to {RESUME_TIMEOUT:.0f} seconds for Player 1 to reconnect. Type 'quit' to stop.")
+    deadline = time.monotonic() + RESUME_TIMEOUT
+
+    reader = stdin_reader()
+    selector = selectors.DefaultSelector()
+    selector.register(s, selectors.EVENT_READ, 'accept')
+    selector.register(reader.fileobj(), selectors.EVENT_READ, 'stdin')
+
+    try:
+        while True:
+            while reader.lines:
+                if reader.lines.popleft().strip().lower() == 'quit':
+                    raise PlayerQuit('You left the game')
+                print('Please wait for Player 1 to reconnect.')
+
+            if reader.eof:
+                raise PlayerQuit('You left the game')
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise SessionClosed('Player 1 did not reconnect')
 
-    return (p1_username, s, conn)
+            ready = [key.data for key, mask in selector.select(remaining)]
+            if 'stdin' in ready:
+                reader.read()
+            if 'accept' not in ready:
+                continue
+
+            loop = accept_resume(s, snapshot)
+            if loop is not None:
+                return loop
+
+    finally:
+        selector.close()
 
 
 
@@ -179,7 +297,7 @@ def check_valid_move(move: int, current_board: list[list[str, str, str]]) -> boo
 
 
 
-def update_valid_board(move: str, player: str, board: list[list[str, str, str]], p2_obj: object) -> str:
+def update_valid_board(move: str, player: str, board: list[list[str, str, str]], p2_obj: object, read_input: object = read_line) -> str:
     """
     Obtain valid moves, and update the tic-tac-toe board.
 
@@ -188,6 +306,7 @@ def update_valid_board(move: str, player: str, board: list[list[str, str, str]],
         player: username of the player who made the move.
         board: a list of a list of rows storing the tic-tac-toe board.
         p2_obj: Boardclass object for player 2.
+        read_input: function used to ask the player for another move.
 
     Returns:
         move: a string containing the integer value of where to place the X/O 
@@ -200,15 +319,15 @@ def update_valid_board(move: str, player: str, board: list[list[str, str, str]],
             move = int(move)
 
             if move <= 0 or move >= 10:
-                move = input('Invalid move. Try again: ')
+                move = read_input('Invalid move. Try again: ')
             else:
                 valid = check_valid_move(move, board)
                 if valid:
                     get_input = False
                 else:
-                    move = input('Invalid move. Try again: ')
-        except:
-            move = input('Invalid move. Try again: ')
+                    move = read_input('Invalid move. Try again: ')
+        except ValueError:
+            move = read_input('Invalid move. Try again: ')
 
     p2_obj.updateGameBoard(move, player, board)
     p2_obj.printBoard(board)
@@ -217,7 +336,39 @@ def update_valid_board(move: str, player: str, board: list[list[str, str, str]],
 
 
 
-def end_game(move: int, player: str, board: list[list[str, str, str]], instance: object, conn: object) -> tuple[list[list[str, str, str]], bool, bool]:
+def play_again(board: list[list[str, str, str]], instance: object, loop: GameEventLoop) -> tuple[list[list[str, str, str]], bool, bool]:
+    """
+    Find out from Player 1 whether to play again once a game is over.
+
+    Args:
+        board: a list of a list of rows storing the tic-tac-toe board.
+        instance: Boardclass object for player 2.
+        loop: GameEventLoop for the connection to player 1.
+
+    Returns:
+        A 3-tuple containing a list of a list of rows for the tic-tac-toe board,
+            and two boolean values indicating whether to end and reset the game.
+    """
+
+    reset_game = False
+    end = False
+
+    play_again = loop.readMessage()
+    
+    if play_again == 'Play Again':
+        board = instance.resetGameBoard(board)
+        reset_game = True
+    elif play_again == 'Fun Times':
+        instance.printStats()
+        end = True
+    else:
+        raise SessionClosed('Player 1 sent an unexpected message')
+
+    return (board, end, reset_game)
+
+
+
+def end_game(move: int, player: str, board: list[list[str, str, str]], instance: object, loop: GameEventLoop, snapshot: SessionSnapshot = None) -> tuple[list[list[str, str, str]], bool, bool]:
     """
     Find out from Player 1 whether to play again, and reset the game accordingly.
 
@@ -226,7 +377,8 @@ def end_game(move: int, player: str, board: list[list[str, str, str]], instance:
         player: username of the player who made the move.
         board: a list of a list of rows storing the tic-tac-toe board.
         instance: Boardclass object for player 2.
-        conn: socket connection
+        loop: GameEventLoop for the connection to player 1.
+        snapshot: SessionSnapshot to record the move and any reset in.
 
     Returns:
         A 3-tuple containing a list of a list of rows for the tic-tac-toe board,
@@ -236,15 +388,17 @@ def end_game(move: int, player: str, board: list[list[str, str, str]], instance:
     reset_game = False
     end = False
 
-    if check_game_over(move, player, board, instance):
-        play_again = conn.recv(1024).decode()
-        
-        if play_again == 'Play Again':
-            board = instance.resetGameBoard(board)
-            reset_game = True
-        if play_again == 'Fun Times':
-            instance.printStats()
-            end = True
+    with span('check_game_over'):
+        game_over = check_game_over(move, player, board, instance)
+
+    if snapshot is not None:
+        snapshot.update(board, instance)
+
+    if game_over:
+        board, end, reset_game = play_again(board, instance, loop)
+
+        if reset_game and snapshot is not None:
+            snapshot.update(board, instance)
 
     return (board, end, reset_game)
 
@@ -253,9 +407,18 @@ def end_game(move: int, player: str, board: list[list[str, str, str]], instance:
 def run_player2() -> None:
     """
     Run the game for player 2.
+
+    Player 2 keeps a snapshot of the session, so if player 1's connection
+    drops it can reconnect and carry on from the last accepted move. The
+    listening socket stays watched during play, since a dropped mobile
+    connection can look alive here until player 1 reconnects.
+
+    Spectators can watch if the TICTACTOE_SPECTATOR_PORT environment
+    variable is set to the port they should connect to.
     """
     
-    p1_username, s, conn = exchange_usernames()
+    snapshot = SessionSnapshot()
+    p1_username, s, loop = exchange_usernames(snapshot)
     p2 = BoardClass(user='Player 2')
 
     p2_board = [
@@ -266,39 +429,104 @@ def run_player2() -> None:
     
     game = True
 
+    hub = None
+    if os.environ.get(SPECTATOR_ENV):
+        hub = SpectatorHub(s.getsockname()[0], int(os.environ[SPECTATOR_ENV]))
+        print(f'Spectators can watch at {hub.address}\n')
+
     p2_instructions()
-    
-    while game:
-        p1_move = conn.recv(1024).decode()
-        print("Player 1's move: ")
-        p2.setPrevious('Player 1')
-
-        p2.updateGameBoard(int(p1_move), 'Player 1', p2_board)
-        p2.printBoard(p2_board)
-
-        p2_board, end, reset_game = end_game(p1_move, 'Player 1', p2_board, p2, conn)
-        if end:
-            game = False
-            continue
-        if reset_game:
-            continue
-        
-        p2_move = input("Player 2's move: ")
-        p2.setPrevious('Player 2')
-        
-        p2_move = update_valid_board(p2_move, 'Player 2', p2_board, p2)
-        conn.sendall(p2_move.encode())
+    print("Type 'quit' at any time to leave the game.\n")
+
+    try:
+        while game:
+            try:
+                if p2.isWinner('Player 1', p2_board) or p2.isWinner('Player 2', p2_board) or p2.boardIsFull(p2_board):
+                    # only after player 1 resumed a game that was already over
+                    p2_board, end, reset_game = play_again(p2_board, p2, loop)
+                    if end:
+                        game = False
+                        continue
+                    snapshot.update(p2_board, p2)
+                    if hub:
+                        hub.publish('reset', board=p2_board)
+                    continue
+
+                if sum(row.count('X') for row in p2_board) == sum(row.count('O') for row in p2_board):
+                    p1_move = loop.readMessage()
+                    print("Player 1's move: ")
+                    p2.setPrevious('Player 1')
+
+                    if not p1_move.isdigit() or not 1 <= int(p1_move) <= 9 or not check_valid_move(int(p1_move), p2_board):
+                        raise SessionClosed('Player 1 sent an invalid move')
+
+                    p2.updateGameBoard(int(p1_move), 'Player 1', p2_board)
+                    p2.printBoard(p2_board)
+                    if hub:
+                        hub.publish('move', 'Player 1', int(p1_move), p2_board)
+
+                    p2_board, end, reset_game = end_game(p1_move, 'Player 1', p2_board, p2, loop, snapshot)
+                    if end:
+                        game = False
+                        continue
+                    if reset_game:
+                        if hub:
+                            hub.publish('reset', board=p2_board)
+                        continue
+                
+                loop.startMoveClock()
+                p2_move = loop.readInput("Player 2's move: ")
+                p2.setPrevious('Player 2')
+                
+                with span('update_valid_board'):
+                    p2_move = update_valid_board(p2_move, 'Player 2', p2_board, p2, loop.readInput)
+                loop.stopMoveClock()
+
+                loop.send(p2_move)
+                if hub:
+                    hub.publish('move', 'Player 2', int(p2_move), p2_board)
+
+                p2_board, end, reset_game = end_game(p2_move, 'Player 2', p2_board, p2, loop, snapshot)
+                if end:
+                    game = False
+                    continue
+                if reset_game:
+                    if hub:
+                        hub.publish('reset', board=p2_board)
+                    continue
+
+            except SessionClosed as error:
+                if not error.resumable:
+                    raise
+
+                if isinstance(error, ReconnectPending):
+                    # the current connection may be half-open, so only a valid resume replaces it
+                    resumed = accept_resume(s, snapshot)
+                    if resumed is None:
+                        continue
+                    loop.close()
+                    loop = resumed
+                else:
+                    print(f'\n{error.reason}.')
+                    loop.close()
+                    loop = wait_for_resume(s, snapshot)
 
-        p2_board, end, reset_game = end_game(p2_move, 'Player 2', p2_board, p2, conn)
-        if end:
-            game = False
-            continue
-        if reset_game:
-            continue
+                # moves that never reached the snapshot are taken back
+                p2_board = snapshot.restore(p2, 'Player 2')
+                print(f'Player 1 reconnected. Game resumed at update {snapshot.seq}.')
+                p2.printBoard(p2_board)
 
+    except SessionClosed as error:
+        print(f'\n{error.reason}.')
+        p2.printStats()
 
-      
-if __name__ == "__main__":
-    run_player2()
+    finally:
+        if hub:
+            hub.publish('end')
+            hub.close()
+        loop.close()
+        s.close()
 
 
+      
+if __name__ == "__main__":
+    profile_session(run_player2)
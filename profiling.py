@@ -0,0 +1,211 @@
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# OPT-IN PROFILING OF A WHOLE GAME SESSION
+#
+# Turn it on with --profile cprofile|sample or TICTACTOE_PROFILE=cprofile|sample.
+# Timed spans for each phase of a turn go to a Chrome trace event file
+# (chrome://tracing, Perfetto, speedscope). cprofile mode also writes a
+# .prof file for pstats/snakeviz, sample mode a .folded file of collapsed
+# stacks for flamegraph.pl/speedscope.
+
+
+PROFILE_ENV = 'TICTACTOE_PROFILE'
+TRACE_ENV = 'TICTACTOE_TRACE'
+DEFAULT_TRACE = 'tictactoe_trace.json'
+MODES = ('cprofile', 'sample')
+SAMPLE_INTERVAL = 0.005
+
+_active = None
+_no_span = contextlib.nullcontext()
+
+
+
+class SessionProfiler:
+    """
+    Record timed spans for a session and profile it with cProfile or sampling.
+
+    Attributes:
+        mode: 'cprofile', 'sample' or None to only record spans.
+        trace_file: path of the Chrome trace event file to write.
+        interval: seconds between stack samples in sample mode.
+    """
+
+
+
+    def __init__(self, mode: str = None, trace_file: str = DEFAULT_TRACE,
+                 interval: float = SAMPLE_INTERVAL) -> None:
+        """
+        Initialize the profiler without starting it.
+
+        Args:
+            mode: 'cprofile', 'sample' or None to only record spans.
+            trace_file: path of the Chrome trace event file to write.
+            interval: seconds between stack samples in sample mode.
+        """
+
+        self.mode = mode
+        self.trace_file = trace_file
+        self.interval = interval
+        self.events = []
+        self.stacks = Counter()
+        self.profile = None
+        self.sampler = None
+        self.stopping = threading.Event()
+        self.start_ns = 0
+        self.pid = os.getpid()
+
+
+
+    def start(self) -> None:
+        """
+        Start recording spans and profiling the calling thread.
+        """
+
+        self.start_ns = time.perf_counter_ns()
+
+        if self.mode == 'cprofile':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif self.mode == 'sample':
+            target = threading.get_ident()
+            self.sampler = threading.Thread(target=self._sample, args=(target,), daemon=True)
+            self.sampler.start()
+
+
+
+    def stop(self) -> list[str]:
+        """
+        Stop profiling and write the output files.
+
+        Returns:
+            paths: the files that were written.
+        """
+
+        paths = [self.trace_file]
+        base = os.path.splitext(self.trace_file)[0]
+
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(base + '.prof')
+            paths.append(base + '.prof')
+
+        if self.sampler is not None:
+            self.stopping.set()
+            self.sampler.join()
+            with open(base + '.folded', 'w') as folded:
+                for stack, count in self.stacks.items():
+                    folded.write(f'{stack} {count}\n')
+            paths.append(base + '.folded')
+
+        with open(self.trace_file, 'w') as trace:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, trace)
+
+        return paths
+
+
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> object:
+        """
+        Time the code in a with block as one complete trace event.
+
+        Args:
+            name: the name of the phase shown in the trace viewer.
+        """
+
+        begin = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.events.append({'name': name, 'cat': 'turn', 'ph': 'X',
+                                'ts': (begin - self.start_ns) / 1000,
+                                'dur': (end - begin) / 1000,
+                                'pid': self.pid, 'tid': threading.get_ident()})
+
+
+
+    def _sample(self, target: int) -> None:
+        """
+        Count the stack of the target thread every interval until stopped.
+
+        Args:
+            target: the thread identifier to sample.
+        """
+
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            names = []
+
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+
+
+def span(name: str) -> object:
+    """
+    Time a phase of a turn if profiling is on, otherwise do nothing.
+
+    Args:
+        name: the name of the phase shown in the trace viewer.
+
+    Returns:
+        A context manager to use in a with statement.
+    """
+
+    if _active is None:
+        return _no_span
+
+    return _active.span(name)
+
+
+
+def profile_session(run: object, argv: list[str] = None) -> None:
+    """
+    Run a game, profiling it if asked to on the command line or environment.
+
+    Args:
+        run: the function that runs the game, e.g. run_player1.
+        argv: the command line arguments, sys.argv[1:] if None.
+    """
+
+    global _active
+
+    parser = argparse.ArgumentParser(description='Play tic-tac-toe.')
+    parser.add_argument('--profile', choices=MODES, default=os.environ.get(PROFILE_ENV) or None,
+                        help=f'profile the session (or set {PROFILE_ENV})')
+    parser.add_argument('--trace', default=os.environ.get(TRACE_ENV, DEFAULT_TRACE),
+                        help=f'trace file to write (or set {TRACE_ENV})')
+    args = parser.parse_args(argv)
+
+    # argparse only checks choices given on the command line, not defaults
+    if args.profile is not None and args.profile not in MODES:
+        parser.error(f"{PROFILE_ENV} must be one of {', '.join(MODES)}, not {args.profile!r}")
+
+    if args.profile is None:
+        run()
+        return
+
+    _active = SessionProfiler(args.profile, args.trace)
+    _active.start()
+
+    try:
+        with span('session'):
+            run()
+    finally:
+        paths = _active.stop()
+        _active = None
+        print(f"Profile written to {', '.join(paths)}")
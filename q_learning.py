@@ -0,0 +1,178 @@
+import argparse
+import numpy as np
+from batch_env import BatchTicTacToeEnv, X_MARK, O_MARK
+
+# TABULAR Q-LEARNING BY SELF-PLAY ON TOP OF THE BATCHED ENVIRONMENT
+
+
+STATE_POWERS = 3 ** np.arange(9, dtype=np.int64)
+STATE_COUNT = 3 ** 9
+
+
+
+def state_index(observations: np.ndarray) -> np.ndarray:
+    """
+    Number every observation from 0 to 3**9 - 1 to index the Q table.
+
+    Args:
+        observations: an int array of shape (B, 9) with values -1, 0 and 1.
+
+    Returns:
+        index: an int64 array of shape (B,).
+    """
+
+    return (observations.astype(np.int64) + 1) @ STATE_POWERS
+
+
+
+class QLearningTrainer:
+    """
+    Learn one Q table for both players by playing the env against itself.
+
+    Observations are from the point of view of the player to move, so the
+    value of the next state is the other player's and is subtracted.
+
+    Attributes:
+        env: the BatchTicTacToeEnv to play in.
+        q_table: a float32 array of shape (3**9, 9).
+        alpha: the learning rate.
+        gamma: the discount factor.
+        epsilon: the chance of making a random legal move while training.
+    """
+
+
+
+    def __init__(self, env: BatchTicTacToeEnv, alpha: float = 0.3, gamma: float = 0.95,
+                 epsilon: float = 0.2, seed: int = None) -> None:
+        """
+        Initialize the trainer with an all zero Q table.
+
+        Args:
+            env: the BatchTicTacToeEnv to play in.
+            alpha: the learning rate.
+            gamma: the discount factor.
+            epsilon: the chance of making a random legal move while training.
+            seed: seed for the random number generator.
+        """
+
+        self.env = env
+        self.q_table = np.zeros((STATE_COUNT, 9), dtype=np.float32)
+        self.alpha = alpha
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.rng = np.random.default_rng(seed)
+
+
+
+    def chooseMoves(self, observations: np.ndarray, epsilon: float = 0.0) -> np.ndarray:
+        """
+        Pick a legal move for every game, greedy with chance 1 - epsilon.
+
+        Args:
+            observations: an int array of shape (B, 9).
+            epsilon: the chance of making a random legal move instead.
+
+        Returns:
+            actions: an int array of shape (B,) with a cell (0-8) for each game.
+        """
+
+        legal = observations == 0
+
+        values = self.q_table[state_index(observations)]
+        greedy = np.where(legal, values, -np.inf).argmax(axis=1)
+
+        noise = np.where(legal, self.rng.random(legal.shape), -1.0)
+        random = noise.argmax(axis=1)
+
+        explore = self.rng.random(len(observations)) < epsilon
+
+        return np.where(explore, random, greedy)
+
+
+
+    def train(self, steps: int) -> None:
+        """
+        Step every game in the env the given number of times, learning as it goes.
+
+        Args:
+            steps: the number of batched steps to play.
+        """
+
+        observations = self.env.reset()
+
+        for _ in range(steps):
+            states = state_index(observations)
+            actions = self.chooseMoves(observations, self.epsilon)
+
+            observations, rewards, dones, info = self.env.step(actions)
+
+            # the next state belongs to the other player, so its value counts against us
+            next_values = np.where(observations == 0, self.q_table[state_index(observations)], -np.inf).max(axis=1)
+            targets = rewards - self.gamma * np.where(dones, 0.0, next_values)
+
+            # many games share a (state, action), so average their errors instead of adding them all up
+            cells, inverse = np.unique(states * 9 + actions, return_inverse=True)
+            errors = targets - self.q_table[states, actions]
+            mean_errors = np.bincount(inverse, weights=errors) / np.bincount(inverse)
+
+            self.q_table.reshape(-1)[cells] += (self.alpha * mean_errors).astype(np.float32)
+
+
+
+    def evaluate(self, games: int, mark: int = X_MARK) -> tuple[float, float, float]:
+        """
+        Play greedy moves against a random player.
+
+        Args:
+            games: the number of games to play, all at once.
+            mark: X_MARK to play as Player 1, O_MARK to play as Player 2.
+
+        Returns:
+            A 3-tuple containing the fraction of games won, tied and lost.
+        """
+
+        env = BatchTicTacToeEnv(games)
+        observations = env.reset()
+        results = np.zeros(games, dtype=np.int8)
+        finished = np.zeros(games, dtype=bool)
+
+        while not finished.all():
+            ours = env.to_move == mark
+            actions = np.where(ours, self.chooseMoves(observations), self.chooseMoves(observations, 1.0))
+
+            observations, rewards, dones, info = env.step(actions)
+
+            new = dones & ~finished
+            results[new] = info['winner'][new]
+            finished |= dones
+
+        return ((results == mark).mean(), (results == 0).mean(), (results == -mark).mean())
+
+
+
+def run_training() -> None:
+    """
+    Train a Q table by self-play and report how it does against a random player.
+    """
+
+    parser = argparse.ArgumentParser(description='Train a tic-tac-toe bot by self-play.')
+    parser.add_argument('--games', type=int, default=1024, help='number of games played at once')
+    parser.add_argument('--steps', type=int, default=2000, help='number of batched steps')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    parser.add_argument('--save', default=None, help='file to save the Q table to (.npy)')
+    args = parser.parse_args()
+
+    trainer = QLearningTrainer(BatchTicTacToeEnv(args.games), seed=args.seed)
+    trainer.train(args.steps)
+
+    for name, mark in (('Player 1', X_MARK), ('Player 2', O_MARK)):
+        won, tied, lost = trainer.evaluate(1000, mark)
+        print(f'As {name} against random moves: {won:.1%} won, {tied:.1%} tied, {lost:.1%} lost')
+
+    if args.save:
+        np.save(args.save, trainer.q_table)
+
+
+
+if __name__ == "__main__":
+    run_training()
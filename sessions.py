@@ -0,0 +1,189 @@
+import secrets
+
+# COMPACT SNAPSHOTS OF A GAME SESSION, KEPT BY PLAYER 2 SO PLAYER 1 CAN RESUME
+#
+# The board is stored as one integer: bit i is set if cell i (0-8, row by
+# row) holds an X, and bit 9 + i is set if it holds an O.
+
+
+SNAPSHOT_PREFIX = 'SNAPSHOT'
+SESSION_PREFIX = 'SESSION'
+RESUME_PREFIX = 'RESUME'
+
+
+
+def board_to_mask(board: list[list[str, str, str]]) -> int:
+    """
+    Pack a board into a single integer.
+
+    Args:
+        board: a list of a list of rows storing the tic-tac-toe board.
+
+    Returns:
+        mask: the X bits in 0-8 and the O bits in 9-17.
+    """
+
+    mask = 0
+
+    for i in range(9):
+        cell = board[i // 3][i % 3]
+        if cell == 'X':
+            mask |= 1 << i
+        elif cell == 'O':
+            mask |= 1 << (9 + i)
+
+    return mask
+
+
+
+def mask_to_board(mask: int) -> list[list[str, str, str]]:
+    """
+    Unpack an integer made by board_to_mask into a board.
+
+    Args:
+        mask: the X bits in 0-8 and the O bits in 9-17.
+
+    Returns:
+        board: a list of a list of rows storing the tic-tac-toe board.
+    """
+
+    board = [
+         ['_','_','_'],
+         ['_','_','_'],
+         ['_','_','_']
+                   ]
+
+    for i in range(9):
+        if mask >> i & 1:
+            board[i // 3][i % 3] = 'X'
+        elif mask >> (9 + i) & 1:
+            board[i // 3][i % 3] = 'O'
+
+    return board
+
+
+
+class SessionSnapshot:
+    """
+    The state of a game session after the last move Player 2 accepted.
+
+    The stats are Player 2's; Player 1's are the same with wins and losses
+    swapped.
+
+    Attributes:
+        token: the secret Player 1 presents to resume the session.
+        board_mask: the board packed by board_to_mask.
+        seq: the number of updates made to the session so far.
+        games: number of games started.
+        wins: number of wins for Player 2.
+        ties: number of ties.
+        losses: number of losses for Player 2.
+    """
+
+    __slots__ = ('token', 'board_mask', 'seq', 'games', 'wins', 'ties', 'losses')
+
+
+
+    def __init__(self, token: str = '', board_mask: int = 0, seq: int = 0, games: int = 0,
+                 wins: int = 0, ties: int = 0, losses: int = 0) -> None:
+        """
+        Initialize the snapshot, with a new random token if none is given.
+
+        Args:
+            token: the secret Player 1 presents to resume the session.
+            board_mask: the board packed by board_to_mask.
+            seq: the number of updates made to the session so far.
+            games: number of games started.
+            wins: number of wins for Player 2.
+            ties: number of ties.
+            losses: number of losses for Player 2.
+        """
+
+        self.token = token or secrets.token_hex(16)
+        self.board_mask = board_mask
+        self.seq = seq
+        self.games = games
+        self.wins = wins
+        self.ties = ties
+        self.losses = losses
+
+
+
+    def update(self, board: list[list[str, str, str]], instance: object) -> None:
+        """
+        Record the board and stats after an accepted move or a reset.
+
+        Args:
+            board: a list of a list of rows storing the tic-tac-toe board.
+            instance: Boardclass object for player 2.
+        """
+
+        self.board_mask = board_to_mask(board)
+        self.seq += 1
+        self.games = instance.games
+        self.wins = instance.wins
+        self.ties = instance.ties
+        self.losses = instance.losses
+
+
+
+    def restore(self, instance: object, player: str) -> list[list[str, str, str]]:
+        """
+        Copy the stats into a player's Boardclass object and unpack the board.
+
+        Args:
+            instance: Boardclass object to restore.
+            player: 'Player 1' or 'Player 2', whose stats instance holds.
+
+        Returns:
+            board: a list of a list of rows storing the tic-tac-toe board.
+        """
+
+        instance.games = self.games
+        instance.ties = self.ties
+
+        if player == 'Player 2':
+            instance.wins = self.wins
+            instance.losses = self.losses
+        elif player == 'Player 1':
+            instance.wins = self.losses
+            instance.losses = self.wins
+
+        return mask_to_board(self.board_mask)
+
+
+
+    def encode(self) -> str:
+        """
+        Write the snapshot as a single message.
+
+        Returns:
+            message: e.g. 'SNAPSHOT <token> <board_mask> <seq> <games> <wins> <ties> <losses>'.
+        """
+
+        return (f'{SNAPSHOT_PREFIX} {self.token} {self.board_mask} {self.seq} '
+                f'{self.games} {self.wins} {self.ties} {self.losses}')
+
+
+
+    @staticmethod
+    def decode(message: str) -> 'SessionSnapshot':
+        """
+        Read a snapshot written by encode.
+
+        Args:
+            message: the snapshot message.
+
+        Returns:
+            snapshot: the SessionSnapshot it describes.
+
+        Raises:
+            ValueError: if the message is not a snapshot.
+        """
+
+        parts = message.split()
+
+        if len(parts) != 8 or parts[0] != SNAPSHOT_PREFIX:
+            raise ValueError('not a session snapshot')
+
+        return SessionSnapshot(parts[1], *[int(part) for part in parts[2:]])
@@ -0,0 +1,335 @@
+import json
+import queue
+import selectors
+import socket
+import threading
+from collections import deque
+
+# LIVE SPECTATOR BROADCAST FOR A RUNNING GAME
+#
+# Player 2 publishes every board update once as an immutable bytes frame.
+# A background thread writes the same frame object to every spectator, so
+# the move loop never waits on a spectator and nothing is rendered per viewer.
+
+
+SPECTATOR_ENV = 'TICTACTOE_SPECTATOR_PORT'
+MAX_QUEUED_FRAMES = 64
+SEND_SIZE = 65536
+
+
+
+class Spectator:
+    """
+    The frames still to be written to one spectator.
+
+    Attributes:
+        sock: non-blocking socket connected to the spectator.
+        frames: a deque of memoryviews of the frames not yet fully sent.
+    """
+
+    __slots__ = ('sock', 'frames')
+
+
+
+    def __init__(self, sock: socket.socket) -> None:
+        """
+        Initialize the spectator with nothing to send.
+
+        Args:
+            sock: non-blocking socket connected to the spectator.
+        """
+
+        self.sock = sock
+        self.frames = deque()
+
+
+
+class SpectatorHub:
+    """
+    Accept spectators and fan every published frame out to all of them.
+
+    A spectator that falls more than max_queued frames behind is dropped
+    instead of slowing everyone else down.
+
+    Attributes:
+        address: a 2-tuple containing the host and port spectators connect to.
+        max_queued: the number of unsent frames a spectator may fall behind.
+    """
+
+
+
+    def __init__(self, host: str, port: int, max_queued: int = MAX_QUEUED_FRAMES) -> None:
+        """
+        Bind the spectator socket and start the broadcast thread.
+
+        Args:
+            host: the host name/IP address to listen on.
+            port: the port to listen on, 0 to pick a free one.
+            max_queued: the number of unsent frames a spectator may fall behind.
+        """
+
+        self.max_queued = max_queued
+        self.seq = 0
+        self.latest = None
+        self.outbox = queue.SimpleQueue()
+        self.spectators = {}
+        self.running = True
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(128)
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()
+
+        # the move loop wakes the broadcast thread by writing to this pair
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ, 'accept')
+        self.selector.register(self.wake_reader, selectors.EVENT_READ, 'wake')
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+
+
+    def publish(self, event: str, player: str = None, move: int = None,
+                board: list[list[str, str, str]] = None) -> None:
+        """
+        Encode a board update once and queue it for every spectator.
+
+        Args:
+            event: 'move', 'reset' or 'end'.
+            player: username of the player who made the move.
+            move: an integer specifying where the X/O was placed.
+            board: a list of a list of rows storing the tic-tac-toe board.
+        """
+
+        self.seq += 1
+        update = {'seq': self.seq, 'event': event, 'player': player, 'move': move}
+        if board is not None:
+            update['board'] = [''.join(row) for row in board]
+
+        frame = (json.dumps(update) + '\n').encode()
+        self.outbox.put(frame)
+        self._wake()
+
+
+
+    def close(self) -> None:
+        """
+        Stop the broadcast thread and disconnect every spectator.
+        """
+
+        if not self.running:
+            return
+
+        self.running = False
+        self._wake()
+        self.thread.join()
+
+        # give every spectator one last chance to get the final frames
+        self._fan_out()
+        for spectator in list(self.spectators.values()):
+            if spectator.frames:
+                self._service(spectator, selectors.EVENT_WRITE)
+            self._drop(spectator)
+
+        self.selector.close()
+        self.listener.close()
+        self.wake_reader.close()
+        self.wake_writer.close()
+
+
+
+    def _wake(self) -> None:
+        """
+        Wake the broadcast thread without ever blocking the caller.
+        """
+
+        try:
+            self.wake_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            # a wake up is already pending
+            pass
+
+
+
+    def _run(self) -> None:
+        """
+        Accept spectators, fan out frames and write to sockets until closed.
+        """
+
+        while self.running:
+            for key, mask in self.selector.select():
+                try:
+                    if key.data == 'accept':
+                        self._accept()
+                    elif key.data == 'wake':
+                        self._fan_out()
+                    elif key.data.sock.fileno() in self.spectators:
+                        self._service(key.data, mask)
+                except Exception:
+                    # one bad spectator must not stop the broadcast for everyone else
+                    if isinstance(key.data, Spectator):
+                        self._drop(key.data)
+
+
+
+    def _accept(self) -> None:
+        """
+        Accept waiting spectators and send them the latest board.
+        """
+
+        while True:
+            try:
+                sock, addr = self.listener.accept()
+            except (BlockingIOError, OSError):
+                return
+
+            sock.setblocking(False)
+            spectator = Spectator(sock)
+            self.spectators[sock.fileno()] = spectator
+
+            if self.latest is not None:
+                spectator.frames.append(memoryview(self.latest))
+                self.selector.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, spectator)
+            else:
+                self.selector.register(sock, selectors.EVENT_READ, spectator)
+
+
+
+    def _fan_out(self) -> None:
+        """
+        Queue every published frame on every spectator, dropping slow ones.
+        """
+
+        try:
+            while self.wake_reader.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+        while True:
+            try:
+                frame = self.outbox.get_nowait()
+            except queue.Empty:
+                return
+
+            self.latest = frame
+            view = memoryview(frame)
+
+            for spectator in list(self.spectators.values()):
+                try:
+                    if len(spectator.frames) >= self.max_queued:
+                        # only drop it if its socket really is not keeping up
+                        self._service(spectator, selectors.EVENT_WRITE)
+                        if spectator.sock.fileno() not in self.spectators:
+                            continue
+                        if len(spectator.frames) >= self.max_queued:
+                            self._drop(spectator)
+                            continue
+
+                    if not spectator.frames:
+                        self.selector.modify(spectator.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, spectator)
+                    spectator.frames.append(view)
+                except (OSError, ValueError):
+                    self._drop(spectator)
+
+
+
+    def _service(self, spectator: Spectator, mask: int) -> None:
+        """
+        Write as much as the spectator's socket takes, or notice it closed.
+
+        Args:
+            spectator: the Spectator whose socket is ready.
+            mask: the selector events that are ready.
+        """
+
+        if mask & selectors.EVENT_READ:
+            try:
+                data = spectator.sock.recv(1024)
+            except BlockingIOError:
+                data = None
+            except OSError:
+                data = b''
+            if data == b'':
+                self._drop(spectator)
+                return
+
+        if mask & selectors.EVENT_WRITE:
+            while spectator.frames:
+                view = spectator.frames[0]
+                try:
+                    sent = spectator.sock.send(view[:SEND_SIZE])
+                except BlockingIOError:
+                    return
+                except OSError:
+                    self._drop(spectator)
+                    return
+
+                if sent < len(view):
+                    spectator.frames[0] = view[sent:]
+                    return
+                spectator.frames.popleft()
+
+            self.selector.modify(spectator.sock, selectors.EVENT_READ, spectator)
+
+
+
+    def _drop(self, spectator: Spectator) -> None:
+        """
+        Disconnect a spectator and forget its queued frames.
+
+        Args:
+            spectator: the Spectator to disconnect.
+        """
+
+        self.spectators.pop(spectator.sock.fileno(), None)
+        try:
+            self.selector.unregister(spectator.sock)
+        except (KeyError, ValueError):
+            pass
+        spectator.sock.close()
+        spectator.frames.clear()
+
+
+
+def watch_game() -> None:
+    """
+    Connect to a running game as a spectator and print every update.
+    """
+
+    host = input('Enter the host name/IP address of player 2: ')
+    port = int(input('Enter the spectator port number: '))
+
+    with socket.create_connection((host, port)) as s:
+        print('Watching the game. Press Ctrl+C to stop.\n')
+
+        for line in s.makefile('r'):
+            update = json.loads(line)
+
+            if update['event'] == 'move':
+                print(f"{update['player']}'s move: {update['move']}")
+            elif update['event'] == 'reset':
+                print('New game!')
+            elif update['event'] == 'end':
+                print('The game has ended.')
+                break
+
+            if 'board' in update:
+                for row in update['board']:
+                    print('\t', list(row))
+                print()
+
+
+
+if __name__ == "__main__":
+    try:
+        watch_game()
+    except KeyboardInterrupt:
+        print()
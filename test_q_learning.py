@@ -0,0 +1,26 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from batch_env import BatchTicTacToeEnv
+from q_learning import QLearningTrainer
+
+
+
+def test_q_values_stay_bounded_with_large_batch():
+    trainer = QLearningTrainer(BatchTicTacToeEnv(1024), seed=0)
+    trainer.train(300)
+
+    # rewards are in [-1, 1], so no value can be learned outside that range
+    assert np.abs(trainer.q_table).max() <= 1.0 + 1e-6
+
+
+
+def test_step_rejects_actions_outside_the_board():
+    env = BatchTicTacToeEnv(2)
+    env.reset()
+
+    with pytest.raises(ValueError):
+        env.step(np.array([0, -1]))
+    with pytest.raises(ValueError):
+        env.step(np.array([9, 0]))
@@ -0,0 +1,533 @@
+import argparse
+import importlib
+import random
+import sys
+import time
+from gameboard import BoardClass
+from player1 import check_valid_move
+
+# DIFFERENTIAL CHECKS AND THROUGHPUT FOR ALTERNATIVE RULES BACKENDS
+#
+# Every backend answers isWinner, boardIsFull, updateGameBoard and
+# check_valid_move for boards in the BoardClass list layout. Its answers are
+# compared with the reference on every reachable 3x3 position and every move
+# from it. BoardClass only knows 3x3 boards, so random larger boards are
+# compared against the same rules written for any size (a full row, column
+# or diagonal wins).
+#
+# A new engine is checked without editing this file by passing
+# --backend module:Class, once for each engine.
+
+
+PLAYERS = ('Player 1', 'Player 2')
+MARKS = {'Player 1': 'X', 'Player 2': 'O'}
+MAX_MISMATCHES_SHOWN = 5
+METHODS = ('isWinner', 'boardIsFull', 'updateGameBoard', 'check_valid_move')
+
+
+
+def win_lines(size: int) -> list[tuple[int, ...]]:
+    """
+    List the cells of every row, column and diagonal of a board.
+
+    Args:
+        size: the number of rows (and columns) of the board.
+
+    Returns:
+        lines: a list of tuples of flat cell indexes (row * size + column).
+    """
+
+    lines = [tuple(row * size + col for col in range(size)) for row in range(size)]
+    lines += [tuple(row * size + col for row in range(size)) for col in range(size)]
+    lines.append(tuple(i * size + i for i in range(size)))
+    lines.append(tuple(i * size + size - 1 - i for i in range(size)))
+
+    return lines
+
+
+
+class ReferenceRules:
+    """
+    The rules as the game plays them: BoardClass and check_valid_move.
+    """
+
+    name = 'reference'
+    sizes = (3,)
+
+
+
+    def __init__(self) -> None:
+        """
+        Initialize the BoardClass object the rules are called on.
+        """
+
+        self.board_obj = BoardClass()
+        self.isWinner = self.board_obj.isWinner
+        self.boardIsFull = self.board_obj.boardIsFull
+        self.updateGameBoard = self.board_obj.updateGameBoard
+        self.check_valid_move = check_valid_move
+
+
+
+class GenericRules:
+    """
+    The same rules written for a board of any size, used as the reference
+    for boards larger than 3x3.
+    """
+
+    name = 'generic'
+    sizes = None
+
+
+
+    def isWinner(self, player: str, board: list) -> bool:
+        """
+        Check for a full row, column or diagonal of the player's mark.
+        """
+
+        mark = MARKS[player]
+        cells = [cell for row in board for cell in row]
+
+        return any(all(cells[i] == mark for i in line) for line in win_lines(len(board)))
+
+
+
+    def boardIsFull(self, board: list) -> bool:
+        """
+        Check that no row has an empty cell.
+        """
+
+        return all('_' not in row for row in board)
+
+
+
+    def updateGameBoard(self, move: int, player: str, current_board: list) -> None:
+        """
+        Put the player's mark on the cell numbered move, row by row from 1.
+        """
+
+        row, col = divmod(move - 1, len(current_board))
+        current_board[row][col] = MARKS[player]
+
+
+
+    def check_valid_move(self, move: int, current_board: list) -> bool:
+        """
+        Check that the cell numbered move is empty. Like the reference, a move
+        off the board is not rejected here.
+        """
+
+        size = len(current_board)
+        if not 1 <= move <= size * size:
+            return True
+
+        row, col = divmod(move - 1, size)
+        return current_board[row][col] == '_'
+
+
+
+class BitmaskRules:
+    """
+    Rules that pack the cells holding a mark into one integer and test each
+    line with a single AND.
+    """
+
+    name = 'bitmask'
+    sizes = None
+
+
+
+    def __init__(self) -> None:
+        """
+        Initialize the cache of line masks for each board size.
+        """
+
+        self.win_masks = {}
+
+
+
+    def isWinner(self, player: str, board: list) -> bool:
+        """
+        Check for a full row, column or diagonal of the player's mark.
+        """
+
+        size = len(board)
+        masks = self.win_masks.get(size)
+        if masks is None:
+            masks = tuple(sum(1 << i for i in line) for line in win_lines(size))
+            self.win_masks[size] = masks
+
+        mark = MARKS[player]
+        bits = 0
+        i = 0
+        for row in board:
+            for cell in row:
+                if cell == mark:
+                    bits |= 1 << i
+                i += 1
+
+        for mask in masks:
+            if bits & mask == mask:
+                return True
+        return False
+
+
+
+    def boardIsFull(self, board: list) -> bool:
+        """
+        Check that no row has an empty cell.
+        """
+
+        for row in board:
+            if '_' in row:
+                return False
+        return True
+
+
+
+    def updateGameBoard(self, move: int, player: str, current_board: list) -> None:
+        """
+        Put the player's mark on the cell numbered move, row by row from 1.
+        """
+
+        size = len(current_board)
+        current_board[(move - 1) // size][(move - 1) % size] = MARKS[player]
+
+
+
+    def check_valid_move(self, move: int, current_board: list) -> bool:
+        """
+        Check that the cell numbered move is empty.
+        """
+
+        size = len(current_board)
+        if not 1 <= move <= size * size:
+            return True
+
+        return current_board[(move - 1) // size][(move - 1) % size] == '_'
+
+
+
+class NumpyRules:
+    """
+    The vectorized checks from batch_env, called one board at a time.
+    """
+
+    name = 'numpy'
+    sizes = (3,)
+
+
+
+    def __init__(self) -> None:
+        """
+        Import NumPy and batch_env, which are only needed for this backend.
+        """
+
+        import numpy
+        import batch_env
+
+        self.batch_env = batch_env
+        self.marks = {'Player 1': numpy.array([batch_env.X_MARK], dtype=numpy.int8),
+                      'Player 2': numpy.array([batch_env.O_MARK], dtype=numpy.int8)}
+
+
+
+    def isWinner(self, player: str, board: list) -> bool:
+        """
+        Check for three in a row with batch_is_winner.
+        """
+
+        boards = self.batch_env.boards_from_lists([board])
+        return bool(self.batch_env.batch_is_winner(boards, self.marks[player])[0])
+
+
+
+    def boardIsFull(self, board: list) -> bool:
+        """
+        Check for empty cells with batch_board_full.
+        """
+
+        return bool(self.batch_env.batch_board_full(self.batch_env.boards_from_lists([board]))[0])
+
+
+
+    def updateGameBoard(self, move: int, player: str, current_board: list) -> None:
+        """
+        Put the player's mark on the array and copy it back into the board.
+        """
+
+        boards = self.batch_env.boards_from_lists([current_board])
+        boards[0, move - 1] = self.marks[player][0]
+        current_board[:] = self.batch_env.boards_to_lists(boards)[0]
+
+
+
+    def check_valid_move(self, move: int, current_board: list) -> bool:
+        """
+        Check that the cell numbered move is empty in the array.
+        """
+
+        if not 1 <= move <= 9:
+            return True
+
+        return bool(self.batch_env.boards_from_lists([current_board])[0, move - 1] == 0)
+
+
+
+def reachable_positions() -> list[list[list[str]]]:
+    """
+    Find every 3x3 position that can come up in a game, starting with Player 1.
+
+    Returns:
+        positions: a list of boards, each a list of 3 rows.
+    """
+
+    positions = []
+    seen = set()
+    checker = BoardClass()
+    stack = [('_' * 9, 'Player 1')]
+
+    while stack:
+        cells, player = stack.pop()
+        if cells in seen:
+            continue
+        seen.add(cells)
+
+        board = [list(cells[0:3]), list(cells[3:6]), list(cells[6:9])]
+        positions.append(board)
+
+        if checker.isWinner('Player 1', board) or checker.isWinner('Player 2', board) or checker.boardIsFull(board):
+            continue
+
+        other = 'Player 2' if player == 'Player 1' else 'Player 1'
+        for i in range(9):
+            if cells[i] == '_':
+                stack.append((cells[:i] + MARKS[player] + cells[i+1:], other))
+
+    return positions
+
+
+
+def random_positions(size: int, count: int, rng: random.Random) -> list[list[list[str]]]:
+    """
+    Make positions on a larger board by playing random moves, X first.
+
+    Args:
+        size: the number of rows (and columns) of the board.
+        count: the number of positions to make.
+        rng: the random number generator to use.
+
+    Returns:
+        positions: a list of boards, each a list of size rows.
+    """
+
+    positions = []
+
+    for _ in range(count):
+        cells = ['_'] * (size * size)
+        order = list(range(size * size))
+        rng.shuffle(order)
+
+        for turn, i in enumerate(order[:rng.randint(0, size * size)]):
+            cells[i] = 'X' if turn % 2 == 0 else 'O'
+
+        positions.append([cells[row * size:(row + 1) * size] for row in range(size)])
+
+    return positions
+
+
+
+def build_cases(positions: list) -> list[tuple]:
+    """
+    List every call to check for each position.
+
+    Args:
+        positions: a list of boards of the same size.
+
+    Returns:
+        cases: a list of (method name, args) tuples.
+    """
+
+    cases = []
+
+    for board in positions:
+        size = len(board)
+        x_count = sum(row.count('X') for row in board)
+        o_count = sum(row.count('O') for row in board)
+        to_move = 'Player 1' if x_count == o_count else 'Player 2'
+
+        for player in PLAYERS:
+            cases.append(('isWinner', (player, board)))
+        cases.append(('boardIsFull', (board,)))
+
+        for move in range(1, size * size + 1):
+            cases.append(('check_valid_move', (move, board)))
+            if board[(move - 1) // size][(move - 1) % size] == '_':
+                cases.append(('updateGameBoard', (move, to_move, board)))
+
+        # just off either end of the board, where backends tend to differ
+        cases.append(('check_valid_move', (0, board)))
+        cases.append(('check_valid_move', (size * size + 1, board)))
+
+    return cases
+
+
+
+def run_cases(backend: object, cases: list[tuple]) -> tuple[list, float]:
+    """
+    Call a backend for every case and time it.
+
+    updateGameBoard is given a copy of the board and its result is the board
+    after the move. A call that raises has the exception's name as its
+    result, so it shows up as a mismatch instead of stopping the run.
+
+    Args:
+        backend: the rules backend to call.
+        cases: a list of (method name, args) tuples.
+
+    Returns:
+        A 2-tuple containing the list of results and the seconds taken.
+    """
+
+    methods = {name: getattr(backend, name) for name in METHODS}
+    results = []
+
+    start = time.perf_counter()
+
+    for name, args in cases:
+        try:
+            if name == 'updateGameBoard':
+                move, player, board = args
+                board = [list(row) for row in board]
+                methods[name](move, player, board)
+                results.append(board)
+            else:
+                results.append(methods[name](*args))
+        except Exception as error:
+            results.append(f'raised {type(error).__name__}')
+
+    return (results, time.perf_counter() - start)
+
+
+
+def compare_backends(backends: list, reference: object, cases: list[tuple], size: int) -> bool:
+    """
+    Check every backend against the reference and print their throughput.
+
+    Args:
+        backends: the rules backends to check.
+        reference: the backend whose answers are correct.
+        cases: a list of (method name, args) tuples.
+        size: the board size the cases are for.
+
+    Returns:
+        passed: True if every backend gave the reference answers.
+    """
+
+    passed = True
+    expected, reference_time = run_cases(reference, cases)
+
+    print(f'{size}x{size} boards, {len(cases)} calls:')
+    print(f'\t{reference.name:<12} {len(cases) / reference_time:>12,.0f} calls/s  (reference)')
+
+    for backend in backends:
+        if backend is reference or (backend.sizes is not None and size not in backend.sizes):
+            continue
+
+        results, elapsed = run_cases(backend, cases)
+        mismatches = [i for i in range(len(cases)) if results[i] != expected[i]]
+
+        speedup = reference_time / elapsed
+        status = 'ok' if not mismatches else f'{len(mismatches)} MISMATCHES'
+        print(f'\t{backend.name:<12} {len(cases) / elapsed:>12,.0f} calls/s  {speedup:5.2f}x  {status}')
+
+        for i in mismatches[:MAX_MISMATCHES_SHOWN]:
+            name, args = cases[i]
+            print(f'\t\t{name}{args}: expected {expected[i]!r}, got {results[i]!r}')
+
+        if mismatches:
+            passed = False
+
+    print()
+
+    return passed
+
+
+
+def load_backend(spec: str) -> object:
+    """
+    Import a backend class named on the command line and create one.
+
+    The class is created with no arguments and needs the four rules methods.
+    Without a name attribute it is shown by its class name, and without a
+    sizes attribute it is checked on every board size.
+
+    Args:
+        spec: the backend as 'module:Class', e.g. 'fast_rules:FastRules'.
+
+    Returns:
+        backend: the new backend object.
+
+    Raises:
+        ValueError: if spec is not 'module:Class' or the class lacks a method.
+        ImportError: if the module can not be imported.
+        AttributeError: if the module has no such class.
+    """
+
+    module_name, _, class_name = spec.partition(':')
+    if not module_name or not class_name:
+        raise ValueError("expected 'module:Class'")
+
+    backend = getattr(importlib.import_module(module_name), class_name)()
+
+    for method in METHODS:
+        if not callable(getattr(backend, method, None)):
+            raise ValueError(f'{class_name} has no {method} method')
+
+    if not hasattr(backend, 'name'):
+        backend.name = class_name
+    if not hasattr(backend, 'sizes'):
+        backend.sizes = None
+
+    return backend
+
+
+
+def run_verification() -> None:
+    """
+    Check every rules backend and report throughput, exiting 1 on a mismatch.
+    """
+
+    parser = argparse.ArgumentParser(description='Check rules backends against the reference rules.')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[4, 5, 7], help='larger board sizes to check')
+    parser.add_argument('--random-boards', type=int, default=2000, help='random positions per larger size')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--backend', action='append', default=[], metavar='MODULE:CLASS',
+                        help='also check this backend class, can be repeated')
+    args = parser.parse_args()
+
+    backends = [ReferenceRules(), GenericRules(), BitmaskRules()]
+    try:
+        backends.append(NumpyRules())
+    except ImportError:
+        print('NumPy is not installed, skipping the numpy backend.\n')
+
+    for spec in args.backend:
+        try:
+            backends.append(load_backend(spec))
+        except (ImportError, AttributeError, ValueError) as error:
+            parser.error(f'--backend {spec}: {error}')
+
+    passed = compare_backends(backends, backends[0], build_cases(reachable_positions()), 3)
+
+    rng = random.Random(args.seed)
+    for size in args.sizes:
+        cases = build_cases(random_positions(size, args.random_boards, rng))
+        passed = compare_backends(backends, backends[1], cases, size) and passed
+
+    sys.exit(0 if passed else 1)
+
+
+
+if __name__ == "__main__":
+    run_verification()